@@ -12,6 +12,7 @@ from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
 import aiosqlite
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from datetime import datetime
+from zoneinfo import ZoneInfo, available_timezones
 from dateutil.relativedelta import relativedelta
 
 # Настройка логгирования
@@ -22,6 +23,11 @@ logging.basicConfig(level=logging.INFO)
 load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_ID = int(os.getenv("ADMIN_ID"))  # Ваш user_id
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Europe/Moscow")  # Часовой пояс для пользователей без настройки
+# Допустимые часовые пояса IANA (системные ключи вроде localtime означают время сервера)
+AVAILABLE_TIMEZONES = available_timezones() - {"localtime", "posixrules", "Factory"}
+if DEFAULT_TIMEZONE not in AVAILABLE_TIMEZONES:
+    raise ValueError(f"Неизвестный часовой пояс в DEFAULT_TIMEZONE: {DEFAULT_TIMEZONE}")
 
 # Инициализация бота и диспетчера
 bot = Bot(token=BOT_TOKEN)
@@ -39,7 +45,7 @@ main_keyboard = ReplyKeyboardMarkup(
         [KeyboardButton(text="Добавить задачу"), KeyboardButton(text="Завершенные задачи")],
         [KeyboardButton(text="Задачи по категориям"), KeyboardButton(text="Мои невыполненные задачи")],
         [KeyboardButton(text="Удалить задачу"), KeyboardButton(text="Завершить задачу")],
-        [KeyboardButton(text="Удалить категорию")],
+        [KeyboardButton(text="Удалить категорию"), KeyboardButton(text="Часовой пояс")],
     ],
     resize_keyboard=True,
 )
@@ -50,12 +56,21 @@ admin_keyboard = ReplyKeyboardMarkup(
         [KeyboardButton(text="Добавить задачу"), KeyboardButton(text="Завершенные задачи")],
         [KeyboardButton(text="Задачи по категориям"), KeyboardButton(text="Мои невыполненные задачи")],
         [KeyboardButton(text="Удалить задачу"), KeyboardButton(text="Завершить задачу")],
-        [KeyboardButton(text="Удалить категорию")],
+        [KeyboardButton(text="Удалить категорию"), KeyboardButton(text="Часовой пояс")],
         [KeyboardButton(text="Статистика")],
     ],
     resize_keyboard=True,
 )
 
+# Периодичности повторяющихся задач
+RECURRING_INTERVALS = ("Ежедневно", "Еженедельно", "Каждые две недели", "Ежемесячно")
+
+# Клавиатура выбора периодичности
+recurrence_keyboard = ReplyKeyboardMarkup(
+    keyboard=[[KeyboardButton(text=interval)] for interval in RECURRING_INTERVALS]
+    + [[KeyboardButton(text="Без повторения")]],
+    resize_keyboard=True,
+)
 
 
 # Состояния для FSM (Finite State Machine)
@@ -66,6 +81,7 @@ class TaskStates(StatesGroup):
     waiting_for_category = State()
     waiting_for_new_category = State()
     waiting_for_recurrence = State()
+    waiting_for_timezone = State()
     editing_task = State()
 
 
@@ -73,8 +89,13 @@ class TaskStates(StatesGroup):
 async def init_db():
     async with aiosqlite.connect(DATABASE) as db:
         await db.execute(
-            "CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT, is_active BOOLEAN DEFAULT 1)"
+            "CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, username TEXT, is_active BOOLEAN DEFAULT 1, timezone TEXT)"
         )
+        # Миграция: добавляем часовой пояс в существующую таблицу users
+        cursor = await db.execute("PRAGMA table_info(users)")
+        user_columns = [column[1] for column in await cursor.fetchall()]
+        if "timezone" not in user_columns:
+            await db.execute("ALTER TABLE users ADD COLUMN timezone TEXT")
         await db.execute(
             "CREATE TABLE IF NOT EXISTS tasks ("
             "id INTEGER PRIMARY KEY, "
@@ -82,21 +103,126 @@ async def init_db():
             "title TEXT, "
             "description TEXT, "
             "status TEXT DEFAULT 'active', "
-            "category TEXT, "
+            "category TEXT, "  # Устаревший текстовый столбец, категория хранится в category_id
             "due_date TEXT, "
-            "completed_at TEXT"  # Новый столбец для даты завершения
+            "completed_at TEXT, "  # Новый столбец для даты завершения
+            "category_id INTEGER REFERENCES categories(id)"
             ")"
         )
         await db.commit()
         await db.execute(
             "CREATE TABLE IF NOT EXISTS recurring_tasks (id INTEGER PRIMARY KEY, task_id INTEGER, interval TEXT, next_date TEXT)"
         )
+        # Индекс для ежедневных запусков по часовым поясам
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_recurring_tasks_next_date ON recurring_tasks (next_date)")
+        await db.execute(
+            "CREATE TABLE IF NOT EXISTS categories ("
+            "id INTEGER PRIMARY KEY, "
+            "user_id INTEGER, "
+            "name TEXT, "
+            "active_count INTEGER NOT NULL DEFAULT 0"  # Количество активных задач, поддерживается триггерами
+            ")"
+        )
+
+        await db.commit()
+
+        # Миграция: связываем задачи с таблицей categories через category_id.
+        # Добавление столбцов и заполнение выполняются в одной транзакции,
+        # чтобы прерванный запуск не оставил столбцы без заполненных данных.
+        await db.execute("BEGIN")
+        needs_backfill = False
+        cursor = await db.execute("PRAGMA table_info(tasks)")
+        task_columns = [column[1] for column in await cursor.fetchall()]
+        if "category_id" not in task_columns:
+            await db.execute("ALTER TABLE tasks ADD COLUMN category_id INTEGER REFERENCES categories(id)")
+            needs_backfill = True
+        cursor = await db.execute("PRAGMA table_info(categories)")
+        category_columns = [column[1] for column in await cursor.fetchall()]
+        if "active_count" not in category_columns:
+            await db.execute("ALTER TABLE categories ADD COLUMN active_count INTEGER NOT NULL DEFAULT 0")
+            needs_backfill = True
+
+        if needs_backfill:
+            # Создаем недостающие категории из текстового столбца tasks.category
+            await db.execute(
+                "INSERT INTO categories (user_id, name) "
+                "SELECT DISTINCT user_id, category FROM tasks "
+                "WHERE category IS NOT NULL AND category != '' AND NOT EXISTS ("
+                "SELECT 1 FROM categories WHERE categories.user_id = tasks.user_id AND categories.name = tasks.category)"
+            )
+            await db.execute(
+                "UPDATE tasks SET category_id = ("
+                "SELECT MIN(categories.id) FROM categories "
+                "WHERE categories.user_id = tasks.user_id AND categories.name = tasks.category) "
+                "WHERE category_id IS NULL AND category IS NOT NULL"
+            )
+            await db.execute(
+                "UPDATE categories SET active_count = ("
+                "SELECT COUNT(*) FROM tasks WHERE tasks.category_id = categories.id AND tasks.status = 'active')"
+            )
+
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_tasks_category_id ON tasks (category_id)")
+        await db.execute("CREATE INDEX IF NOT EXISTS idx_categories_user_name ON categories (user_id, name)")
+
+        # Триггеры для подсчета активных задач в категориях
+        await db.execute(
+            "CREATE TRIGGER IF NOT EXISTS tasks_active_count_insert AFTER INSERT ON tasks "
+            "WHEN NEW.status = 'active' AND NEW.category_id IS NOT NULL BEGIN "
+            "UPDATE categories SET active_count = active_count + 1 WHERE id = NEW.category_id; "
+            "END"
+        )
+        await db.execute(
+            "CREATE TRIGGER IF NOT EXISTS tasks_active_count_delete AFTER DELETE ON tasks "
+            "WHEN OLD.status = 'active' AND OLD.category_id IS NOT NULL BEGIN "
+            "UPDATE categories SET active_count = active_count - 1 WHERE id = OLD.category_id; "
+            "END"
+        )
         await db.execute(
-            "CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY, user_id INTEGER, name TEXT)"
+            "CREATE TRIGGER IF NOT EXISTS tasks_active_count_update AFTER UPDATE OF status, category_id ON tasks BEGIN "
+            "UPDATE categories SET active_count = active_count - 1 WHERE id = OLD.category_id AND OLD.status = 'active'; "
+            "UPDATE categories SET active_count = active_count + 1 WHERE id = NEW.category_id AND NEW.status = 'active'; "
+            "END"
+        )
+        # При удалении категории задачи остаются без категории
+        await db.execute(
+            "CREATE TRIGGER IF NOT EXISTS categories_delete AFTER DELETE ON categories BEGIN "
+            "UPDATE tasks SET category_id = NULL WHERE category_id = OLD.id; "
+            "END"
         )
         await db.commit()
 
 
+# Получение объекта часового пояса по названию (с откатом на пояс по умолчанию)
+def get_zone(tz_name: str) -> ZoneInfo:
+    if tz_name not in AVAILABLE_TIMEZONES:
+        return ZoneInfo(DEFAULT_TIMEZONE)
+    return ZoneInfo(tz_name)
+
+# Текущая дата в часовом поясе пользователя
+def today_in_zone(tz_name: str) -> str:
+    return datetime.now(get_zone(tz_name)).strftime("%Y-%m-%d")
+
+# Получение часового пояса пользователя из базы данных
+async def get_user_timezone(db, user_id: int) -> str:
+    cursor = await db.execute("SELECT timezone FROM users WHERE id = ?", (user_id,))
+    row = await cursor.fetchone()
+    return row[0] if row and row[0] else DEFAULT_TIMEZONE
+
+
+# Получение id категории пользователя по названию (категория создается, если её нет).
+# Возвращает id категории и признак того, что она была создана.
+async def get_or_create_category(db, user_id: int, name: str) -> tuple[int, bool]:
+    cursor = await db.execute(
+        "SELECT MIN(id) FROM categories WHERE user_id = ? AND name = ?",
+        (user_id, name),
+    )
+    row = await cursor.fetchone()
+    if row[0] is not None:
+        return row[0], False
+    cursor = await db.execute("INSERT INTO categories (user_id, name) VALUES (?, ?)", (user_id, name))
+    return cursor.lastrowid, True
+
+
 # Команда /start
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message):
@@ -152,20 +278,15 @@ async def process_task_description(message: types.Message, state: FSMContext):
 @dp.message(TaskStates.waiting_for_category, F.text != "Добавить новую категорию")
 async def process_task_category(message: types.Message, state: FSMContext):
     category = message.text
-    await state.update_data(category=category)
+    user_id = message.from_user.id
+
+    async with aiosqlite.connect(DATABASE) as db:
+        category_id, _ = await get_or_create_category(db, user_id, category)
+        await db.commit()
+    await state.update_data(category_id=category_id)
 
     # Переходим к выбору периодичности
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Ежедневно")],
-            [KeyboardButton(text="Еженедельно")],
-            [KeyboardButton(text="Каждые две недели")],
-            [KeyboardButton(text="Ежемесячно")],
-            [KeyboardButton(text="Без повторения")],
-        ],
-        resize_keyboard=True,
-    )
-    await message.answer("Выберите периодичность задачи:", reply_markup=keyboard)
+    await message.answer("Выберите периодичность задачи:", reply_markup=recurrence_keyboard)
     await state.set_state(TaskStates.waiting_for_recurrence)
 
 @dp.message(TaskStates.waiting_for_category, F.text == "Добавить новую категорию")
@@ -179,56 +300,43 @@ async def process_new_category(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
 
     async with aiosqlite.connect(DATABASE) as db:
-        # Проверяем, существует ли такая категория для данного пользователя
-        cursor = await db.execute(
-            "SELECT id FROM categories WHERE user_id = ? AND name = ?",
-            (user_id, new_category),
-        )
-        existing_category = await cursor.fetchone()
-
-        if existing_category:
-            # Если категория уже существует, просто используем её
-            await message.answer(f"Категория '{new_category}' уже существует. Используем её.")
-        else:
-            # Если категории нет, добавляем её в базу данных
-            await db.execute("INSERT INTO categories (user_id, name) VALUES (?, ?)", (user_id, new_category))
-            await db.commit()
-            await message.answer(f"Новая категория '{new_category}' добавлена.")
+        # Используем существующую категорию или добавляем новую
+        category_id, created = await get_or_create_category(db, user_id, new_category)
+        await db.commit()
+
+    if created:
+        await message.answer(f"Новая категория '{new_category}' добавлена.")
+    else:
+        await message.answer(f"Категория '{new_category}' уже существует. Используем её.")
 
     # Обновляем данные в состоянии
-    await state.update_data(category=new_category)
+    await state.update_data(category_id=category_id)
 
     # Переходим к выбору периодичности
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Ежедневно")],
-            [KeyboardButton(text="Еженедельно")],
-            [KeyboardButton(text="Каждые две недели")],
-            [KeyboardButton(text="Ежемесячно")],
-            [KeyboardButton(text="Без повторения")],
-        ],
-        resize_keyboard=True,
-    )
-    await message.answer("Выберите периодичность задачи:", reply_markup=keyboard)
+    await message.answer("Выберите периодичность задачи:", reply_markup=recurrence_keyboard)
     await state.set_state(TaskStates.waiting_for_recurrence)
 
 @dp.message(TaskStates.waiting_for_recurrence)
 async def process_task_recurrence(message: types.Message, state: FSMContext):
     recurrence = message.text
     user_id = message.from_user.id
+    if recurrence not in RECURRING_INTERVALS and recurrence != "Без повторения":
+        await message.answer("Выберите периодичность с помощью кнопок:", reply_markup=recurrence_keyboard)
+        return
     data = await state.get_data()
 
     # Сохраняем задачу
     async with aiosqlite.connect(DATABASE) as db:
         cursor = await db.execute(
-            "INSERT INTO tasks (user_id, title, description, category) VALUES (?, ?, ?, ?)",
-            (user_id, data["title"], data["description"], data["category"]),
+            "INSERT INTO tasks (user_id, title, description, category_id) VALUES (?, ?, ?, ?)",
+            (user_id, data["title"], data["description"], data["category_id"]),
         )
         task_id = cursor.lastrowid
 
         # Если задача повторяющаяся, сохраняем информацию о повторении
         if recurrence != "Без повторения":
-            next_date = calculate_next_date(recurrence)
+            tz_name = await get_user_timezone(db, user_id)
+            next_date = calculate_next_date(recurrence, tz_name)
             await db.execute(
                 "INSERT INTO recurring_tasks (task_id, interval, next_date) VALUES (?, ?, ?)",
                 (task_id, recurrence, next_date),
@@ -241,8 +349,8 @@ async def process_task_recurrence(message: types.Message, state: FSMContext):
         await message.answer(f"Задача добавлена! Периодичность: {recurrence}", reply_markup=main_keyboard)
     await state.clear()
 
-def calculate_next_date(interval: str) -> str:
-    today = datetime.now()
+def calculate_next_date(interval: str, tz_name: str = DEFAULT_TIMEZONE) -> str:
+    today = datetime.now(get_zone(tz_name))
     if interval == "Ежедневно":
         next_date = today + relativedelta(days=1)
     elif interval == "Еженедельно":
@@ -255,36 +363,55 @@ def calculate_next_date(interval: str) -> str:
         next_date = today
     return next_date.strftime("%Y-%m-%d")
 
-async def create_recurring_tasks():
-    today = datetime.now().strftime("%Y-%m-%d")
+# Создание повторяющихся задач для пользователей одного часового пояса
+async def create_recurring_tasks(tz_name: str):
+    today = today_in_zone(tz_name)
     async with aiosqlite.connect(DATABASE) as db:
-        cursor = await db.execute("SELECT task_id, interval, next_date FROM recurring_tasks WHERE next_date = ?", (today,))
+        cursor = await db.execute(
+            "SELECT recurring_tasks.id, recurring_tasks.interval, "
+            "tasks.user_id, tasks.title, tasks.description, tasks.category_id "
+            "FROM recurring_tasks "
+            "JOIN tasks ON tasks.id = recurring_tasks.task_id "
+            "LEFT JOIN users ON users.id = tasks.user_id "
+            "WHERE COALESCE(users.timezone, ?) = ? AND recurring_tasks.next_date <= ? "
+            f"AND recurring_tasks.interval IN ({', '.join('?' * len(RECURRING_INTERVALS))})",  # Старые записи могут содержать произвольный текст
+            (DEFAULT_TIMEZONE, tz_name, today, *RECURRING_INTERVALS),
+        )
         recurring_tasks = await cursor.fetchall()
+        if not recurring_tasks:
+            return
 
-        for task in recurring_tasks:
-            task_id, interval, next_date = task
-            # Создаем новую задачу на основе повторяющейся
-            cursor = await db.execute("SELECT * FROM tasks WHERE id = ?", (task_id,))
-            original_task = await cursor.fetchone()
-
-            if original_task:
-                user_id, title, description, status, category = original_task[1:6]
-                status = 'active'
-                await db.execute(
-                    "INSERT INTO tasks (user_id, title, description, status, category) VALUES (?, ?, ?, ?, ?)",
-                    (user_id, title, description, status, category),
-                )
-                # Обновляем следующую дату для повторяющейся задачи
-                new_next_date = calculate_next_date(interval)
-                await db.execute(
-                    "UPDATE recurring_tasks SET next_date = ? WHERE id = ?",
-                    (new_next_date, task_id),
-                )
+        # Создаем новые задачи на основе повторяющихся одним пакетом
+        await db.executemany(
+            "INSERT INTO tasks (user_id, title, description, status, category_id) VALUES (?, ?, ?, 'active', ?)",
+            [(user_id, title, description, category_id) for _, _, user_id, title, description, category_id in recurring_tasks],
+        )
+        # Обновляем следующую дату для повторяющихся задач
+        await db.executemany(
+            "UPDATE recurring_tasks SET next_date = ? WHERE id = ?",
+            [(calculate_next_date(interval, tz_name), recurring_id) for recurring_id, interval, *_ in recurring_tasks],
+        )
         await db.commit()
+    logging.info(f"Повторяющиеся задачи созданы для пояса {tz_name}: {len(recurring_tasks)}")
+
+# Планировщик для часового пояса: запуск каждый день в 00:00 по местному времени
+def schedule_timezone_bucket(tz_name: str):
+    job_id = f"recurring_{tz_name}"
+    if scheduler.get_job(job_id):
+        return
+    scheduler.add_job(
+        create_recurring_tasks, "cron", hour=0, minute=0,
+        timezone=get_zone(tz_name), args=[tz_name], id=job_id,
+    )
 
-# Планировщик для создания повторяющихся задач
-def schedule_recurring_tasks():
-    scheduler.add_job(create_recurring_tasks, "cron", hour=0, minute=0)  # Запуск каждый день в 00:00
+# Планировщик для создания повторяющихся задач (отдельный запуск на каждый часовой пояс)
+async def schedule_recurring_tasks():
+    async with aiosqlite.connect(DATABASE) as db:
+        cursor = await db.execute("SELECT DISTINCT timezone FROM users WHERE timezone IS NOT NULL")
+        timezones = {row[0] for row in await cursor.fetchall()}
+    timezones.add(DEFAULT_TIMEZONE)
+    for tz_name in timezones:
+        schedule_timezone_bucket(tz_name)
 
 # Просмотр задач
 @dp.message(F.text == "Мои невыполненные задачи")
@@ -294,8 +421,9 @@ async def show_tasks(message: types.Message):
     async with aiosqlite.connect(DATABASE) as db:
         # Получаем только активные задачи
         cursor = await db.execute(
-            "SELECT tasks.id, tasks.title, tasks.description, tasks.category, recurring_tasks.interval "
+            "SELECT tasks.id, tasks.title, tasks.description, COALESCE(categories.name, 'Без категории'), recurring_tasks.interval "
             "FROM tasks "
+            "LEFT JOIN categories ON categories.id = tasks.category_id "
             "LEFT JOIN recurring_tasks ON tasks.id = recurring_tasks.task_id "
             "WHERE tasks.user_id = ? AND tasks.status = 'active'",
             (user_id,),
@@ -356,19 +484,26 @@ def build_tasks_keyboard(tasks: list, page: int, action: str):
 @dp.message(F.text == "Задачи по категориям")
 async def show_categories(message: types.Message):
     user_id = message.from_user.id
-    today_data = datetime.now().strftime("%Y-%m-%d")
 
-    # Получаем список уникальных категорий пользователя
+    # Получаем категории пользователя с активными задачами или задачами, завершенными сегодня
     async with aiosqlite.connect(DATABASE) as db:
-        cursor = await db.execute("SELECT DISTINCT category FROM tasks WHERE user_id = ? and (completed_at is null or completed_at = ?)", (user_id, today_data,))
+        today_data = today_in_zone(await get_user_timezone(db, user_id))
+        cursor = await db.execute(
+            "SELECT id, name, active_count, completed_today FROM ("
+            "SELECT id, name, active_count, "
+            "(SELECT COUNT(*) FROM tasks WHERE tasks.category_id = categories.id AND tasks.completed_at = ?) AS completed_today "
+            "FROM categories WHERE user_id = ?"
+            ") WHERE active_count > 0 OR completed_today > 0 ORDER BY name",
+            (today_data, user_id),
+        )
         categories = await cursor.fetchall()
 
     if categories:
         # Создаем inline-клавиатуру с категориями
         keyboard = InlineKeyboardBuilder()
-        for category in categories:
-            if category[0]:  # Проверяем, что категория не пустая
-                keyboard.add(InlineKeyboardButton(text=category[0], callback_data=f"category_{category[0]}"))
+        for category_id, name, active_count, completed_today in categories:
+            counts = f"⏳ {active_count}, ✅ {completed_today}" if completed_today else f"⏳ {active_count}"
+            keyboard.add(InlineKeyboardButton(text=f"{name} ({counts})", callback_data=f"category_{category_id}"))
         keyboard.adjust(1)  # 1 кнопка в строке
         await message.answer("Выберите категорию:", reply_markup=keyboard.as_markup())
     else:
@@ -377,14 +512,22 @@ async def show_categories(message: types.Message):
 # Обработчик для выбора категории
 @dp.callback_query(F.data.startswith("category_"))
 async def show_tasks_by_category(callback: types.CallbackQuery):
-    today_data = datetime.now().strftime("%Y-%m-%d")
     user_id = callback.from_user.id
-    category = callback.data.split("_")[1]  # Получаем выбранную категорию
+    raw_id = callback.data.split("_", 1)[1]  # Получаем id выбранной категории
+    category_id = int(raw_id) if raw_id.isdigit() else None  # Старые кнопки содержат название категории
 
     # Получаем задачи из выбранной категории
     async with aiosqlite.connect(DATABASE) as db:
-        cursor = await db.execute("SELECT id, user_id, title, description, status FROM tasks WHERE user_id = ? AND category = ? and (completed_at is null or completed_at = ?)",
-                                  (user_id, category, today_data))
+        today_data = today_in_zone(await get_user_timezone(db, user_id))
+        cursor = await db.execute("SELECT name FROM categories WHERE id = ? AND user_id = ?", (category_id, user_id))
+        row = await cursor.fetchone()
+        if row is None:
+            await callback.message.answer("Категория не найдена.")
+            await callback.answer()
+            return
+        category = row[0]
+        cursor = await db.execute("SELECT id, user_id, title, description, status FROM tasks WHERE category_id = ? AND user_id = ? and (completed_at is null or completed_at = ?)",
+                                  (category_id, user_id, today_data))
         tasks = await cursor.fetchall()
 
     if tasks:
@@ -471,8 +614,8 @@ async def handle_complete_task(callback: types.CallbackQuery):
     else:
         # Завершение задачи
         task_id = int(data[1])
-        completed_at = datetime.now().strftime("%Y-%m-%d")  # Текущая дата
         async with aiosqlite.connect(DATABASE) as db:
+            completed_at = today_in_zone(await get_user_timezone(db, user_id))  # Текущая дата пользователя
             await db.execute(
                 "UPDATE tasks SET status = 'completed', completed_at = ? WHERE id = ? AND user_id = ?",
                 (completed_at, task_id, user_id),
@@ -531,7 +674,10 @@ async def show_completed_tasks(callback: types.CallbackQuery):
 
     async with aiosqlite.connect(DATABASE) as db:
         cursor = await db.execute(
-            "SELECT id, user_id, title, description, status, category, completed_at FROM tasks WHERE user_id = ? AND status = 'completed' AND completed_at = ?",
+            "SELECT tasks.id, tasks.user_id, tasks.title, tasks.description, tasks.status, "
+            "COALESCE(categories.name, 'Без категории'), tasks.completed_at "
+            "FROM tasks LEFT JOIN categories ON categories.id = tasks.category_id "
+            "WHERE tasks.user_id = ? AND tasks.status = 'completed' AND tasks.completed_at = ?",
             (user_id, date),
         )
         tasks = await cursor.fetchall()
@@ -589,6 +735,38 @@ async def disable_bot(message: types.Message):
     await message.answer("Бот отключен. Чтобы снова включить, отправьте /start.")
 
 
+# Обработчик для кнопки "Часовой пояс"
+@dp.message(F.text == "Часовой пояс")
+async def ask_timezone(message: types.Message, state: FSMContext):
+    async with aiosqlite.connect(DATABASE) as db:
+        tz_name = await get_user_timezone(db, message.from_user.id)
+    await message.answer(
+        f"Ваш часовой пояс: {tz_name}\n"
+        "Введите новый часовой пояс в формате IANA (например, Europe/Moscow или Asia/Yekaterinburg):"
+    )
+    await state.set_state(TaskStates.waiting_for_timezone)
+
+@dp.message(TaskStates.waiting_for_timezone)
+async def process_timezone(message: types.Message, state: FSMContext):
+    tz_name = (message.text or "").strip()
+    user_id = message.from_user.id
+    if tz_name not in AVAILABLE_TIMEZONES:
+        await message.answer("Неизвестный часовой пояс. Попробуйте еще раз, например: Europe/Moscow")
+        return
+
+    async with aiosqlite.connect(DATABASE) as db:
+        await db.execute("INSERT OR IGNORE INTO users (id, username) VALUES (?, ?)", (user_id, message.from_user.username))
+        await db.execute("UPDATE users SET timezone = ? WHERE id = ?", (tz_name, user_id))
+        await db.commit()
+
+    # Запускаем генерацию повторяющихся задач для нового часового пояса
+    schedule_timezone_bucket(tz_name)
+
+    keyboard = admin_keyboard if user_id == ADMIN_ID else main_keyboard
+    await message.answer(f"Часовой пояс установлен: {tz_name}", reply_markup=keyboard)
+    await state.clear()
+
+
 # Обработчик для кнопки "Статистика"
 @dp.message(F.text == "Статистика", F.from_user.id == ADMIN_ID)
 async def admin_stats(message: types.Message):
@@ -621,14 +799,14 @@ async def delete_category(message: types.Message):
 
     # Получаем список уникальных категорий пользователя
     async with aiosqlite.connect(DATABASE) as db:
-        cursor = await db.execute("SELECT DISTINCT name FROM categories WHERE user_id = ?", (user_id,))
+        cursor = await db.execute("SELECT id, name FROM categories WHERE user_id = ? ORDER BY name", (user_id,))
         categories = await cursor.fetchall()
 
     if categories:
         # Создаем inline-клавиатуру с категориями
         keyboard = InlineKeyboardBuilder()
-        for category in categories:
-            keyboard.add(InlineKeyboardButton(text=category[0], callback_data=f"delette_category_{category[0]}"))
+        for category_id, name in categories:
+            keyboard.add(InlineKeyboardButton(text=name, callback_data=f"delette_category_{category_id}"))
         keyboard.adjust(1)  # 1 кнопка в строке
         await message.answer("Выберите категорию для удаления:", reply_markup=keyboard.as_markup())
     else:
@@ -638,10 +816,18 @@ async def delete_category(message: types.Message):
 @dp.callback_query(F.data.startswith("delette_category_"))
 async def handle_delete_category(callback: types.CallbackQuery):
     user_id = callback.from_user.id
-    category_name = callback.data.split("_")[2]  # Получаем название категории
+    raw_id = callback.data.split("_", 2)[2]  # Получаем id категории
+    category_id = int(raw_id) if raw_id.isdigit() else None  # Старые кнопки содержат название категории
     async with aiosqlite.connect(DATABASE) as db:
-        # Удаляем категорию из таблицы categories
-        await db.execute("DELETE FROM categories WHERE user_id = ? AND name = ?", (user_id, category_name))
+        cursor = await db.execute("SELECT name FROM categories WHERE id = ? AND user_id = ?", (category_id, user_id))
+        row = await cursor.fetchone()
+        if row is None:
+            await callback.message.answer("Категория не найдена.")
+            await callback.answer()
+            return
+        category_name = row[0]
+        # Удаляем категорию из таблицы categories (триггер отвязывает её задачи)
+        await db.execute("DELETE FROM categories WHERE id = ? AND user_id = ?", (category_id, user_id))
         await db.commit()
 
     await callback.message.answer(f"Категория '{category_name}' удалена.")
@@ -676,7 +862,7 @@ async def handle_unknown(message: types.Message):
 async def main():
     await init_db()
     # schedule_task_mover()
-    schedule_recurring_tasks()
+    await schedule_recurring_tasks()
     scheduler.start()
     await dp.start_polling(bot)
 